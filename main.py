@@ -1,15 +1,16 @@
-import json
+import sys
 
 from src.configuration import RmqConfiguration
 from src.io.consumer import RMQConsumer
+from src.io.serialization import loads
 from src.logger import logger
 from src.trading.exchanges.simulated_exchange import SimulatedExchange
 from src.trading.arbitrage_detector import ArbitrageDetector
 from src.trading.message_proccesor import MessageProcessor
 
-COINBASE_NAME = "Coinbase"
-BYBIT_NAME = "Bybit"
-KRAKEN_NAME = "Kraken"
+COINBASE_NAME = sys.intern("Coinbase")
+BYBIT_NAME = sys.intern("Bybit")
+KRAKEN_NAME = sys.intern("Kraken")
 
 def main():
     # Initialize exchanges with initial funds
@@ -36,22 +37,34 @@ def main():
                            exchange_name=RmqConfiguration.EXCHANGE_NAME,
                            queue_name=RmqConfiguration.QUEUE_NAME,
                            routing_key=RmqConfiguration.ROUTING_KEY,
-                           max_queue_length=RmqConfiguration.QUEUE_LENGTH, )
+                           max_queue_length=RmqConfiguration.QUEUE_LENGTH,
+                           ack_batch_size=RmqConfiguration.ACK_BATCH_SIZE,
+                           ack_batch_interval_ms=RmqConfiguration.ACK_BATCH_INTERVAL_MS,
+                           heartbeat=RmqConfiguration.HEARTBEAT,
+                           blocked_connection_timeout=RmqConfiguration.BLOCKED_CONNECTION_TIMEOUT, )
 
-    def process_message(message):
+    def process_messages(messages):
         """
-        Process an incoming message.
-        :param message: The message body as a string.
+        Process a batch of incoming messages.
+        :param messages: The raw message bodies as bytes.
         """
-        logger.debug(f"Processing message: {message}")
-        message = json.loads(message)
+        logger.debug("Processing %d messages", len(messages))
         # Add your trade-making logic here
-        message_processor.process_message(message)
+        decoded = []
+        for message in messages:
+            try:
+                decoded.append(loads(message))
+            except ValueError as e:
+                # Skip only the malformed message, the rest of the batch is still valid
+                logger.error("Skipping malformed message: %s", e)
+        message_processor.process_batch(decoded)
 
-    # Process each message
+    # Process messages in batches
     try:
         consumer.connect()  # Connect to RabbitMQ
-        consumer.consume(process_message)  # Start consuming messages
+        consumer.consume_batches(process_messages,
+                                 batch_size=RmqConfiguration.BATCH_SIZE,
+                                 batch_timeout_ms=RmqConfiguration.BATCH_TIMEOUT_MS)  # Start consuming messages
     except KeyboardInterrupt:
         logger.info("Shutting down...")
     finally:
@@ -2,7 +2,7 @@ import dataclasses
 import os
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True)
 class LoggerConfiguration:
-    FILE_LOG_LEVEL = os.getenv("FILE_LOG_LEVEL", "INFO")
-    CONSOLE_LOG_LEVEL = os.getenv("CONSOLE_LOG_LEVEL", "INFO")
+    FILE_LOG_LEVEL: str = os.getenv("FILE_LOG_LEVEL", "INFO")
+    CONSOLE_LOG_LEVEL: str = os.getenv("CONSOLE_LOG_LEVEL", "INFO")
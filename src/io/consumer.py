@@ -1,10 +1,16 @@
 import pika
 import json
+import time
 from src.logger import logger
 
 
 class RMQConsumer:
-    def __init__(self, rabbitmq_url, exchange_name, queue_name, routing_key, max_queue_length=1000):
+    # Topologies already declared by this process, as (url, exchange, queue, routing key)
+    _declared = set()
+
+    def __init__(self, rabbitmq_url, exchange_name, queue_name, routing_key, max_queue_length=1000,
+                 ack_batch_size=100, ack_batch_interval_ms=200, heartbeat=60, blocked_connection_timeout=300,
+                 log_every=1000):
         """
         Initialize the RMQConsumer.
         :param rabbitmq_url: URL of the RabbitMQ server.
@@ -12,12 +18,23 @@ class RMQConsumer:
         :param queue_name: Name of the queue to declare.
         :param routing_key: Routing key for binding.
         :param max_queue_length: Maximum number of messages the queue can hold.
+        :param ack_batch_size: Number of processed messages acknowledged together with a single multi-ack.
+        :param ack_batch_interval_ms: Maximum time a processed message may wait for its acknowledgement.
+        :param heartbeat: AMQP heartbeat interval in seconds.
+        :param blocked_connection_timeout: Seconds to wait on a broker-blocked connection before failing.
+        :param log_every: Log a progress line at INFO level every this many consumed messages.
         """
         self.rabbitmq_url = rabbitmq_url
         self.exchange_name = exchange_name
         self.queue_name = queue_name
         self.routing_key = routing_key
         self.max_queue_length = max_queue_length
+        self.ack_batch_size = max(1, ack_batch_size)
+        self.ack_batch_interval_ms = ack_batch_interval_ms
+        self.heartbeat = heartbeat
+        self.blocked_connection_timeout = blocked_connection_timeout
+        self.log_every = max(1, log_every)
+        self.consumed_count = 0
         self.connection = None
         self.channel = None
 
@@ -25,45 +42,147 @@ class RMQConsumer:
         """Establish connection to RabbitMQ and set up the queue."""
         try:
             logger.info(f"Connecting to RabbitMQ at {self.rabbitmq_url}")
-            self.connection = pika.BlockingConnection(pika.URLParameters(self.rabbitmq_url))
+            parameters = pika.URLParameters(self.rabbitmq_url)
+            parameters.heartbeat = self.heartbeat
+            parameters.blocked_connection_timeout = self.blocked_connection_timeout
+            self.connection = pika.BlockingConnection(parameters)
             self.channel = self.connection.channel()
 
-            # Declare the exchange
-            self.channel.exchange_declare(exchange=self.exchange_name, exchange_type='direct', durable=True)
-
-            # Declare the queue with max length
-            self.channel.queue_declare(
-                queue=self.queue_name,
-                durable=True,
-                arguments={"x-max-length": self.max_queue_length},
-            )
+            topology = (self.rabbitmq_url, self.exchange_name, self.queue_name, self.routing_key)
+            if topology in RMQConsumer._declared:
+                try:
+                    # Already declared by this process: a passive declare only checks the queue still exists
+                    self.channel.queue_declare(queue=self.queue_name, passive=True)
+                    logger.info(f"Queue '{self.queue_name}' already declared, skipping topology setup")
+                except pika.exceptions.ChannelClosedByBroker:
+                    logger.warning(f"Queue '{self.queue_name}' is gone, declaring it again")
+                    RMQConsumer._declared.discard(topology)
+                    self.channel = self.connection.channel()
+                    self._declare_topology()
+            else:
+                self._declare_topology()
+            RMQConsumer._declared.add(topology)
 
-            # Bind the queue to the exchange with the routing key
-            self.channel.queue_bind(exchange=self.exchange_name, queue=self.queue_name, routing_key=self.routing_key)
-            logger.info(f"Queue '{self.queue_name}' bound to exchange '{self.exchange_name}' with routing key '{self.routing_key}'")
+            # Keep enough unacknowledged deliveries in flight to fill the next ack batch
+            self.channel.basic_qos(prefetch_count=self.ack_batch_size * 2)
         except Exception as e:
             logger.error(f"Failed to connect and configure RabbitMQ: {e}", exc_info=True)
             raise
 
+    def _declare_topology(self):
+        """Declare the exchange and the queue, and bind them with the routing key."""
+        # Declare the exchange
+        self.channel.exchange_declare(exchange=self.exchange_name, exchange_type='direct', durable=True)
+
+        # Declare the queue with max length
+        self.channel.queue_declare(
+            queue=self.queue_name,
+            durable=True,
+            arguments={"x-max-length": self.max_queue_length},
+        )
+
+        # Bind the queue to the exchange with the routing key
+        self.channel.queue_bind(exchange=self.exchange_name, queue=self.queue_name, routing_key=self.routing_key)
+        logger.info(f"Queue '{self.queue_name}' bound to exchange '{self.exchange_name}' with routing key '{self.routing_key}'")
+
     def consume(self, message_callback):
         """
         Start consuming messages from the queue.
-        :param message_callback: Function to process incoming messages.
+        Successfully processed messages are acknowledged in batches with a single multi-ack.
+        :param message_callback: Function to process incoming message bodies (bytes).
         """
+        interval = self.ack_batch_interval_ms / 1000
+        pending_tag = None
+        pending_count = 0
+        last_flush = time.monotonic()
         try:
             logger.info(f"Starting to consume messages from queue: {self.queue_name}")
-            for method, properties, body in self.channel.consume(queue=self.queue_name, auto_ack=False):
+            for method, properties, body in self.channel.consume(queue=self.queue_name, auto_ack=False,
+                                                                 inactivity_timeout=interval):
+                if method is not None:
+                    try:
+                        logger.debug("Received message: %s", body)
+                        message_callback(body)  # Process the raw message bytes
+                        pending_tag = method.delivery_tag
+                        pending_count += 1
+                        self._count_consumed(1)
+                    except Exception as e:
+                        logger.error("Error processing message: %s", e, exc_info=True)
+                        # Acknowledge everything processed before the failing message, then reject it
+                        if pending_tag is not None:
+                            self.channel.basic_ack(delivery_tag=pending_tag, multiple=True)
+                            pending_tag, pending_count, last_flush = None, 0, time.monotonic()
+                        self.channel.basic_nack(delivery_tag=method.delivery_tag, multiple=False, requeue=False)
+                        continue
+
+                # Flush on batch size, on interval expiry or when the queue went idle
+                if pending_tag is not None and (method is None or pending_count >= self.ack_batch_size or
+                                                time.monotonic() - last_flush >= interval):
+                    self.channel.basic_ack(delivery_tag=pending_tag, multiple=True)
+                    pending_tag, pending_count, last_flush = None, 0, time.monotonic()
+        except Exception as e:
+            logger.error(f"Error during message consumption: {e}", exc_info=True)
+            raise
+        finally:
+            self._flush_acks(pending_tag)
+
+    def consume_batches(self, batch_callback, batch_size=100, batch_timeout_ms=50):
+        """
+        Start consuming messages from the queue in batches.
+        A batch is handed over once it holds batch_size messages, batch_timeout_ms passed since its first message or
+        the queue went idle, and is acknowledged (or rejected) as a whole with a single multi-ack.
+        :param batch_callback: Function to process a list of incoming message bodies (bytes).
+        :param batch_size: Maximum number of messages per batch.
+        :param batch_timeout_ms: Maximum time the first message of a batch waits for further messages.
+        """
+        timeout = batch_timeout_ms / 1000
+        bodies = []
+        last_tag = None
+        batch_started = 0.0
+        try:
+            logger.info(f"Starting to consume message batches from queue: {self.queue_name}")
+            for method, properties, body in self.channel.consume(queue=self.queue_name, auto_ack=False,
+                                                                 inactivity_timeout=timeout):
+                if method is not None:
+                    if not bodies:
+                        batch_started = time.monotonic()
+                    bodies.append(body)
+                    last_tag = method.delivery_tag
+                    # A steady feed never goes idle, so also cut the batch when its first message is due
+                    if len(bodies) < batch_size and time.monotonic() - batch_started < timeout:
+                        continue
+                if not bodies:
+                    continue
+
                 try:
-                    logger.debug(f"Received message: {body.decode()}")
-                    message_callback(body.decode())  # Process the message
-                    self.channel.basic_ack(delivery_tag=method.delivery_tag)  # Acknowledge message
+                    batch_callback(bodies)  # Process the batch of raw message bytes
+                    self.channel.basic_ack(delivery_tag=last_tag, multiple=True)  # Acknowledge the batch
+                    self._count_consumed(len(bodies))
                 except Exception as e:
-                    logger.error(f"Error processing message: {e}", exc_info=True)
-                    self.channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)  # Reject message
+                    logger.error("Error processing batch of %d messages: %s", len(bodies), e, exc_info=True)
+                    self.channel.basic_nack(delivery_tag=last_tag, multiple=True, requeue=False)  # Reject the batch
+                bodies = []
+                last_tag = None
         except Exception as e:
             logger.error(f"Error during message consumption: {e}", exc_info=True)
             raise
 
+    def _count_consumed(self, count):
+        """Add processed messages to the running total and log progress every log_every messages."""
+        previous = self.consumed_count
+        self.consumed_count += count
+        if self.consumed_count // self.log_every != previous // self.log_every:
+            logger.info("Consumed %d messages from queue %s", self.consumed_count, self.queue_name)
+
+    def _flush_acks(self, delivery_tag):
+        """Acknowledge all deliveries up to and including delivery_tag, if the channel is still usable."""
+        if delivery_tag is None or self.channel is None or not self.channel.is_open:
+            return
+        try:
+            self.channel.basic_ack(delivery_tag=delivery_tag, multiple=True)
+        except Exception as e:
+            logger.error(f"Failed to acknowledge pending messages: {e}", exc_info=True)
+
     def close(self):
         """Close the RabbitMQ connection."""
         try:
@@ -0,0 +1,30 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    loads = orjson.loads
+
+    def dumps(obj, indent=False):
+        """
+        Serialize an object to JSON.
+        :param obj: The object to serialize.
+        :param indent: Pretty-print with an indentation of two spaces.
+        :return: The JSON document as UTF-8 encoded bytes.
+        """
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+else:
+    loads = json.loads
+
+    def dumps(obj, indent=False):
+        """
+        Serialize an object to JSON.
+        :param obj: The object to serialize.
+        :param indent: Pretty-print with an indentation of two spaces.
+        :return: The JSON document as UTF-8 encoded bytes.
+        """
+        return json.dumps(obj, indent=2 if indent else None).encode()
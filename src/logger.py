@@ -1,5 +1,7 @@
+import atexit
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 from src.configuration import LoggerConfiguration
 import os
 
@@ -7,9 +9,13 @@ import os
 LOG_DIR = "logs"
 os.makedirs(LOG_DIR, exist_ok=True)
 
+# Skip thread/process introspection when creating log records, none of the formats use it
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
 # Create a logger
 logger = logging.getLogger("trade-maker-logger")
-logger.setLevel(logging.DEBUG)
 
 # Create a console handler
 console_handler = logging.StreamHandler()
@@ -21,20 +27,30 @@ file_handler = TimedRotatingFileHandler(
     when="midnight",  # Rotate logs at midnight
     interval=1,       # Every 1 day
     backupCount=7,    # Keep the last 7 logs
-    encoding="utf-8"
+    encoding="utf-8",
+    delay=True        # Open the file on the first emitted record
 )
 file_handler.setLevel(LoggerConfiguration.FILE_LOG_LEVEL)  # File logs DEBUG and above
 
-# Create a formatter
+# Create formatters: the console gets a short line, the file keeps the call site
+console_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
 formatter = logging.Formatter(
     "%(asctime)s - %(levelname)s - %(message)s - [%(module)s %(funcName)s %(lineno)d]"
 )
-console_handler.setFormatter(formatter)
+console_handler.setFormatter(console_formatter)
 file_handler.setFormatter(formatter)
 
-# Add handlers to the logger
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
+# Route records through a queue so console and file I/O run on a background thread
+_log_queue = queue.SimpleQueue()
+logger.addHandler(QueueHandler(_log_queue))
+
+# Drop records no handler would emit before they are built and formatted on the caller's thread
+logger.setLevel(min(console_handler.level, file_handler.level))
+
+# The listener drains the queue into the real handlers, each applying its own level
+listener = QueueListener(_log_queue, console_handler, file_handler, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)
 
 # Example logging
 logger.info("Logger initialized successfully")
@@ -1,4 +1,20 @@
 from collections import defaultdict, deque
+from dataclasses import dataclass
+from operator import itemgetter
+
+
+@dataclass(slots=True, frozen=True)
+class Opportunity:
+    type: str  # 'open' or 'close'
+    symbol: str
+    buy_exchange: str
+    buy_price: float
+    sell_exchange: str
+    sell_price: float
+    spread: float = 0.0
+    amount: float = 0.0
+    pair_key: tuple = None
+
 
 class ArbitrageDetector:
     def __init__(self, simulators, threshold=0.5, alignment_threshold=0.01, history_size=5):
@@ -6,77 +22,114 @@ class ArbitrageDetector:
         self.threshold = threshold
         self.alignment_threshold = alignment_threshold
         self.history_size = history_size
-        self.price_state = defaultdict(lambda: defaultdict(deque))  # Exchange-symbol price history
-        self.arbitrage_pairs = set()  # Track active arbitrage pairs
+        # Exchange-symbol price history of (price, timestamp) tuples, bounded deques drop the oldest entry on append
+        self.price_state = defaultdict(lambda: defaultdict(lambda: deque(maxlen=self.history_size)))
+        self.latest_prices = defaultdict(dict)  # Symbol -> {exchange with a simulator: latest price}
+        self._lowest_price = {}  # Symbol -> (exchange, price) of the cheapest exchange
+        self._highest_price = {}  # Symbol -> (exchange, price) of the most expensive exchange
+        self.arbitrage_pairs = set()  # Track active arbitrage pairs as (symbol, buy exchange, sell exchange)
+        self._symbol_pairs = defaultdict(set)  # Symbol -> its active arbitrage pairs
+        self._symbols = {}  # Instrument id -> symbol, e.g. 'BTC-USD' -> 'BTC/USD'
+
+    def to_symbol(self, instrument_id):
+        """
+        Translate an instrument id to the symbol used by the simulators, caching the result.
+        :param instrument_id: The instrument id from the feed (e.g., 'BTC-USD').
+        :return: The symbol (e.g., 'BTC/USD').
+        """
+        symbol = self._symbols.get(instrument_id)
+        if symbol is None:
+            symbol = self._symbols[instrument_id] = instrument_id.replace("-", "/")
+        return symbol
+
+    def release_pair(self, pair_key):
+        """
+        Stop tracking an arbitrage pair once its positions are closed, or when it could not be opened.
+        :param pair_key: The pair key (symbol, buy exchange, sell exchange) of the opportunity.
+        """
+        self.arbitrage_pairs.discard(pair_key)
+        pairs = self._symbol_pairs.get(pair_key[0])
+        if pairs is not None:
+            pairs.discard(pair_key)
 
     def update_prices(self, message):
         exchange_name = message["exchange"]
-        symbol = message["instrument_id"].replace("-", "/")
+        symbol = self.to_symbol(message["instrument_id"])
         price = message["price"]
         timestamp = message["timestamp"]
 
-        if len(self.price_state[exchange_name][symbol]) >= self.history_size:
-            self.price_state[exchange_name][symbol].popleft()
-        self.price_state[exchange_name][symbol].append({"price": price, "timestamp": timestamp})
+        self.price_state[exchange_name][symbol].append((price, timestamp))
+        if exchange_name not in self.simulators:
+            return  # Only exchanges that can trade compete for the extremes
+        prices = self.latest_prices[symbol]
+        prices[exchange_name] = price
 
-    def detect_opportunity(self, symbol):
-        prices = {}
-        for exchange_name, symbols in self.price_state.items():
-            if symbol in symbols and symbols[symbol]:
-                prices[exchange_name] = symbols[symbol][-1]["price"]
+        # Keep the cheapest and most expensive exchange up to date, rescanning only
+        # when the exchange holding the extreme moved away from it
+        lowest = self._lowest_price.get(symbol)
+        if lowest is None or price < lowest[1]:
+            self._lowest_price[symbol] = (exchange_name, price)
+        elif lowest[0] == exchange_name:
+            self._lowest_price[symbol] = min(prices.items(), key=itemgetter(1))
+
+        highest = self._highest_price.get(symbol)
+        if highest is None or price > highest[1]:
+            self._highest_price[symbol] = (exchange_name, price)
+        elif highest[0] == exchange_name:
+            self._highest_price[symbol] = max(prices.items(), key=itemgetter(1))
 
-        if len(prices) < 2:
+    def detect_opportunity(self, symbol):
+        prices = self.latest_prices.get(symbol)
+        if not prices or len(prices) < 2:
             return None
 
         opportunities = []
 
-        # Detect arbitrage opportunities for opening positions
-        for buy_exchange, buy_price in prices.items():
-            for sell_exchange, sell_price in prices.items():
-                if buy_exchange == sell_exchange:
-                    continue
-                pair_key = f"{buy_exchange}-{sell_exchange}"
-                reverse_pair_key = f"{sell_exchange}-{buy_exchange}"
-                spread = ((sell_price - buy_price) / buy_price) * 100
-
-                # Check for existing positions and prevent duplicate trades
-                if spread >= self.threshold and pair_key not in self.arbitrage_pairs and reverse_pair_key not in self.arbitrage_pairs:
-                    opportunities.append({
-                        "type": "open",
-                        "symbol": symbol,
-                        "buy_exchange": buy_exchange,
-                        "buy_price": buy_price,
-                        "sell_exchange": sell_exchange,
-                        "sell_price": sell_price,
-                        "spread": spread,
-                    })
-                    self.arbitrage_pairs.add(pair_key)
+        # Detect arbitrage opportunities for opening positions:
+        # the widest spread is always between the cheapest and the most expensive exchange
+        buy_exchange, buy_price = self._lowest_price[symbol]
+        sell_exchange, sell_price = self._highest_price[symbol]
+        if buy_exchange != sell_exchange:
+            pair_key = (symbol, buy_exchange, sell_exchange)
+            reverse_pair_key = (symbol, sell_exchange, buy_exchange)
+            spread = ((sell_price - buy_price) / buy_price) * 100
+
+            # Check for existing positions and prevent duplicate trades
+            if spread >= self.threshold and pair_key not in self.arbitrage_pairs and reverse_pair_key not in self.arbitrage_pairs:
+                opportunities.append(Opportunity("open", symbol, buy_exchange, buy_price, sell_exchange, sell_price,
+                                                 spread=spread, pair_key=pair_key))
+                self.arbitrage_pairs.add(pair_key)
+                self._symbol_pairs[symbol].add(pair_key)
+
+        # Only symbols with an active pair can have positions to close
+        if not self._symbol_pairs.get(symbol):
+            return opportunities if opportunities else None
+
+        # Collect open long and short amounts once per exchange
+        longs = {}
+        shorts = {}
+        for exchange_name in prices:
+            simulator = self.simulators.get(exchange_name)
+            position = simulator.positions.get(symbol) if simulator is not None else None
+            if position:
+                if position["long"] > 0:
+                    longs[exchange_name] = position["long"]
+                if position["short"] > 0:
+                    shorts[exchange_name] = position["short"]
 
         # Detect opportunities to close matching positions across exchanges
-        for buy_exchange, buy_price in prices.items():
-            for sell_exchange, sell_price in prices.items():
+        for buy_exchange, long_amount in longs.items():
+            for sell_exchange, short_amount in shorts.items():
                 if buy_exchange == sell_exchange:
                     continue
-                pair_key = f"{buy_exchange}-{sell_exchange}"
+                pair_key = (symbol, buy_exchange, sell_exchange)
                 if pair_key in self.arbitrage_pairs:
-                    buy_simulator = self.simulators[buy_exchange]
-                    sell_simulator = self.simulators[sell_exchange]
-                    if (symbol in buy_simulator.positions and buy_simulator.positions[symbol]["long"] > 0 and
-                            symbol in sell_simulator.positions and sell_simulator.positions[symbol]["short"] > 0):
-                        # Check if prices align within the threshold
-                        if abs((buy_price - sell_price) / sell_price) * 100 <= self.alignment_threshold:
-                            opportunities.append({
-                                "type": "close",
-                                "symbol": symbol,
-                                "buy_exchange": buy_exchange,
-                                "buy_price": buy_price,
-                                "sell_exchange": sell_exchange,
-                                "sell_price": sell_price,
-                                "amount": min(
-                                    buy_simulator.positions[symbol]["long"],
-                                    sell_simulator.positions[symbol]["short"]
-                                ),
-                                "pair_key": pair_key,
-                            })
+                    buy_price = prices[buy_exchange]
+                    sell_price = prices[sell_exchange]
+                    # Check if prices align within the threshold
+                    if abs((buy_price - sell_price) / sell_price) * 100 <= self.alignment_threshold:
+                        opportunities.append(Opportunity("close", symbol, buy_exchange, buy_price, sell_exchange,
+                                                         sell_price, amount=min(long_amount, short_amount),
+                                                         pair_key=pair_key))
 
         return opportunities if opportunities else None
@@ -1,56 +1,77 @@
 import base64
-import json
+import itertools
+import urllib.parse
 
 import requests
 import time
 import hmac
 import hashlib
+from src.io.serialization import dumps
 from src.logger import logger
 
 
 class KrakenFuturesTrading:
-    def __init__(self, api_key, api_secret, sandbox=True):
+    def __init__(self, api_key, api_secret, sandbox=True, ticker_ttl=0.5):
         """
         Initialize Kraken Futures Trading instance.
         :param api_key: Kraken Futures API key.
         :param api_secret: Kraken Futures API secret.
         :param sandbox: Use sandbox environment if True.
+        :param ticker_ttl: Seconds a fetched ticker snapshot is reused before fetching again.
         """
         self.api_key = api_key
         self.api_secret = api_secret
         self.base_url = 'https://demo-futures.kraken.com' if sandbox else 'https://futures.kraken.com'
+        # Decode the secret once and keep a keyed HMAC whose copies skip the key setup per request
+        self._hmac = hmac.new(base64.b64decode(api_secret), digestmod=hashlib.sha512)
+        # Strictly increasing nonces seeded from the clock, next() on a count is atomic under the GIL
+        self._nonce = itertools.count(int(time.time() * 1000))
+        # Reuse one keep-alive HTTP session for all requests instead of a new connection per call
+        self._session = requests.Session()
+        self._session.headers.update({
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'API-Key': self.api_key,
+        })
+        self._ticker_ttl = ticker_ttl
+        self._ticker_cache = None
+        self._ticker_cache_ts = 0.0
 
-    def _sign(self, endpoint, data):
-        """Generate Kraken API signature."""
-        nonce = str(int(time.time() * 1000))
-        post_data = json.dumps(data) if data else '{}'
-        message = (nonce + post_data).encode()
-        signature = hmac.new(
-            base64.b64decode(self.api_secret),
-            (endpoint.encode() + hashlib.sha256(message).digest()),
-            hashlib.sha512,
-        ).digest()
-        return base64.b64encode(signature).decode(), nonce
+    def _sign(self, endpoint, body, nonce):
+        """Generate Kraken API signature for an already serialized request body."""
+        message = nonce.encode() + body
+        mac = self._hmac.copy()
+        mac.update(endpoint.encode() + hashlib.sha256(message).digest())
+        signature = mac.digest()
+        return base64.b64encode(signature).decode()
 
-    def _private_request(self, endpoint, data=None):
+    def _private_request(self, endpoint, data=None, method='POST'):
         """
         Make a private API request.
         :param endpoint: The endpoint for the request (e.g., '/0/private/Balance').
-        :param data: Payload for the request.
+        :param data: Payload for POST requests, query parameters for GET requests.
+        :param method: HTTP method, 'POST' or 'GET'.
         :return: API response as a dictionary.
         """
         url = f"{self.base_url}{endpoint}"
-        data = data or {}
-        signature, nonce = self._sign(endpoint, data)
-        headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-            'API-Key': self.api_key,
-            'API-Sign': signature,
-        }
-        data['nonce'] = nonce  # Add nonce to the payload
+        nonce = str(next(self._nonce))
         try:
-            response = requests.post(url, headers=headers, data=json.dumps(data))
+            if method == 'GET':
+                # GET requests carry no body, the nonce travels in a header and the signature covers the query
+                # string exactly as it is sent
+                query = urllib.parse.urlencode(data or {})
+                headers = {
+                    'Nonce': nonce,
+                    'API-Sign': self._sign(endpoint, query.encode(), nonce),
+                }
+                response = self._session.get(f"{url}?{query}" if query else url, headers=headers)
+            else:
+                # Serialize the payload once, the signature covers exactly the bytes that are sent
+                body = dumps({**(data or {}), 'nonce': nonce})
+                headers = {
+                    'API-Sign': self._sign(endpoint, body, nonce),
+                }
+                response = self._session.post(url, headers=headers, data=body)
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -58,16 +79,26 @@ class KrakenFuturesTrading:
             return None
 
     def get_tickers(self):
-        """Fetch market tickers."""
+        """Fetch market tickers, reusing the last snapshot while it is younger than ticker_ttl."""
+        now = time.monotonic()
+        if self._ticker_cache is not None and now - self._ticker_cache_ts < self._ticker_ttl:
+            return self._ticker_cache
+
         endpoint = '/derivatives/api/v3/tickers'
         try:
-            response = requests.get(f"{self.base_url}{endpoint}")
+            response = self._session.get(f"{self.base_url}{endpoint}")
             response.raise_for_status()
-            return response.json()
+            self._ticker_cache = response.json()
+            self._ticker_cache_ts = now
+            return self._ticker_cache
         except Exception as e:
             logger.error(f"Error fetching tickers: {e}")
             return None
 
+    def invalidate_tickers(self):
+        """Drop the cached ticker snapshot so the next get_tickers call fetches fresh data."""
+        self._ticker_cache = None
+
     def place_order(self, symbol, side, size, limit_price=None):
         """
         Place a futures order.
@@ -96,12 +127,7 @@ class KrakenFuturesTrading:
         endpoint = '/derivatives/api/v3/accounts'
         try:
             url = f"{self.base_url}{endpoint}"
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'API-Key': self.api_key,
-            }
-            response = requests.get(url, headers=headers)
+            response = self._session.get(url)
             response.raise_for_status()
             return response.json()
         except Exception as e:
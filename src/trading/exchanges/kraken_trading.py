@@ -20,26 +20,34 @@ class KrakenTrading:
         self.api_key = api_key
         self.api_secret = api_secret
         self.base_url = 'https://api.sandbox.kraken.com' if sandbox else 'https://api.kraken.com'
-
+        self._hmac = hmac.new(base64.b64decode(api_secret), digestmod=hashlib.sha512)  # Copied by _sign
+        self._session = requests.Session()
+        self._session.headers['API-Key'] = self.api_key  # The only header shared by all private calls
 
     def _sign(self, endpoint, data):
-        """Generate Kraken API signature."""
+        """
+        Generate Kraken API signature.
+        :return: Tuple of the signature and the URL-encoded body it covers, to be sent as is.
+        """
         # Convert data to a URL-encoded string
         post_data = urllib.parse.urlencode(data).encode()
         message = f"/0/private/{endpoint}".encode() + hashlib.sha256(post_data).digest()
-        secret = base64.b64decode(self.api_secret)
-        signature = hmac.new(secret, message, hashlib.sha512).digest()
-        return base64.b64encode(signature).decode()
+        mac = self._hmac.copy()
+        mac.update(message)
+        signature = mac.digest()
+        return base64.b64encode(signature).decode(), post_data
 
     def _private_request(self, endpoint, data):
         """Make a private API request to Kraken."""
+        signature, post_data = self._sign(endpoint, data)
         headers = {
-            'API-Key': self.api_key,
-            'API-Sign': self._sign(endpoint, data),
+            'API-Sign': signature,
+            # requests sets no content type for a pre-encoded bytes body
+            'Content-Type': 'application/x-www-form-urlencoded',
         }
         url = f"{self.base_url}/0/private/{endpoint}"
         try:
-            response = requests.post(url, headers=headers, data=data)
+            response = self._session.post(url, headers=headers, data=post_data, timeout=10)
             response.raise_for_status()
             return response.json()
         except Exception as e:
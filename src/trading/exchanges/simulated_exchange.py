@@ -1,14 +1,46 @@
-import json
+import atexit
 import os
-from datetime import datetime
-from collections import defaultdict
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from collections import defaultdict, deque
 
+from src.io.serialization import dumps, loads
 from src.logger import logger
+from src.trading.orders import Order
+
+_fdatasync = getattr(os, "fdatasync", os.fsync)  # fdatasync is not available on every platform
+_JOURNAL_BATCH_SIZE = 64  # Journal lines handed to a single writev call
+_JOURNAL_READ_BLOCK = 64 * 1024  # Bytes read at a time when loading the end of the journal
+
+
+def _fsync_directory(path):
+    """
+    Flush a directory entry change, such as a rename, to disk.
+    :param path: The directory.
+    """
+    try:
+        descriptor = os.open(path or ".", os.O_RDONLY)
+    except OSError:
+        return  # Directories can't be opened on every platform
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
 
 
 class SimulatedExchange:
+    __slots__ = ('exchange_name', 'fee_rate', 'leverage', 'persist', 'storage_file', 'orders_file',
+                 'real_balance', 'loaned_balance', 'positions', 'orders',
+                 '_orders_journal', '_pair_cache', '_flush_interval', '_dirty', '_flush_lock',
+                 '_state_changed', '_journal_queue', '_state_lock',
+                 '_inv_leverage', '_margin_fee_rate')
+
     def __init__(self, exchange_name, initial_funds=None, fee_rate=0.001, leverage=10, persist=False,
-                 storage_dir="storage"):
+                 storage_dir="storage", orders_in_memory=1000, flush_interval_ms=50):
         """
         Initialize the simulated exchange with margin trading.
         :param exchange_name: Name of the exchange.
@@ -16,75 +48,235 @@ class SimulatedExchange:
         :param fee_rate: Trading fee rate as a decimal, e.g., 0.001 for 0.1%.
         :param leverage: Leverage multiplier, e.g., 10 for 10x leverage.
         :param persist: Whether to persist balances and positions.
+        :param orders_in_memory: Number of most recent orders kept in self.orders, None keeps all of them.
+        :param flush_interval_ms: Time state changes and orders are coalesced for before a background thread writes them.
         """
         self.exchange_name = exchange_name
         self.fee_rate = fee_rate
         self.leverage = leverage
+        # Per-notional coefficients so the order path multiplies instead of dividing by the leverage
+        self._inv_leverage = 1.0 / leverage
+        self._margin_fee_rate = self._inv_leverage + fee_rate
         self.persist = persist
         self.storage_file = os.path.join(storage_dir, f"{exchange_name}_state.json") if persist else None
+        # Orders are appended to a journal instead of being rewritten with the state on every order
+        self.orders_file = os.path.join(storage_dir, f"{exchange_name}_orders.jsonl") if persist else None
+        self._orders_journal = None  # Descriptor of the orders journal, opened for appending
+        self._pair_cache = {}  # Symbol -> (base asset, quote asset)
+        # Only the most recent orders stay in memory, the full history is in the orders journal
+        self.orders = deque(maxlen=orders_in_memory)
+        # State changes and orders are only queued, a background thread writes them out in coalesced batches
+        self._flush_interval = flush_interval_ms / 1000
+        self._dirty = threading.Event()  # Set while there is anything to write
+        self._flush_lock = threading.Lock()
+        self._state_lock = threading.Lock()  # Held while balances and positions change or are snapshotted
+        self._state_changed = False
+        self._journal_queue = queue.SimpleQueue()  # Serialized journal lines waiting to be written
+        if self.persist:
+            threading.Thread(target=self._flush_loop, name=f"{exchange_name}-flusher", daemon=True).start()
+            atexit.register(self.flush)
 
         # Load persistent data or initialize with initial funds
         if self.persist and os.path.exists(self.storage_file):
             self._load_persistent_data()
         else:
-            self.real_balance = defaultdict(float, initial_funds or {})
-            self.loaned_balance = defaultdict(float)
+            self.real_balance = dict(initial_funds or {})
+            self.loaned_balance = {}
             self.positions = defaultdict(lambda: {"long": 0, "short": 0, "long_entry_price": None, "short_entry_price": None})
-            self.orders = []
             # makedirs
             os.makedirs(storage_dir, exist_ok=True)
+            if self.persist:
+                self._reset_orders_journal()
             self._save_persistent_data()
 
     def get_balance(self):
         """
-        Return the current balances, including real and loaned funds.
+        Return a snapshot of the current balances, including real and loaned funds.
         """
         return {
             "real_balance": dict(self.real_balance),
             "loaned_balance": dict(self.loaned_balance),
-            "positions": {symbol: {
-                "long": data["long"],
-                "short": data["short"],
-                "long_entry_price": data["long_entry_price"],
-                "short_entry_price": data["short_entry_price"],
-            } for symbol, data in self.positions.items()},
+            "positions": {symbol: dict(position) for symbol, position in self.positions.items()},
         }
 
     def _save_persistent_data(self):
+        """Schedule the current state to be written by the background flusher."""
         if not self.persist:
             return
-        state = {
-            "real_balance": dict(self.real_balance),
-            "loaned_balance": dict(self.loaned_balance),
-            "positions": dict(self.positions),  # Save the updated structure
-            "orders": self.orders,
-        }
-        with open(self.storage_file, "w") as file:
-            json.dump(state, file, indent=4)
+        self._state_changed = True
+        self._dirty.set()
+
+    def _flush_loop(self):
+        """Wait for state changes and orders and write them out at most once per flush interval."""
+        while True:
+            self._dirty.wait()
+            time.sleep(self._flush_interval)  # Let a burst of orders settle into a single write
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"[{self.exchange_name}] Failed to persist state: {e}", exc_info=True)
+
+    def flush(self):
+        """Write queued orders to the journal and the state to disk now, if anything changed since the last write."""
+        with self._flush_lock:
+            # Clear before draining so changes made during the write schedule another one
+            self._dirty.clear()
+            self._write_journal(self._drain_journal_queue())
+            if not self._state_changed:
+                return
+            self._state_changed = False
+            # Snapshot under the state lock so a half-applied trade is never saved
+            with self._state_lock:
+                state = {
+                    "real_balance": dict(self.real_balance),
+                    "loaned_balance": dict(self.loaned_balance),
+                    "positions": {symbol: dict(position) for symbol, position in self.positions.items()},
+                }
+            # Write a temporary file and swap it in, a crash mid-write never leaves a truncated state file
+            temporary_file = f"{self.storage_file}.tmp"
+            with open(temporary_file, "wb") as file:
+                file.write(dumps(state))
+                file.flush()
+                os.fsync(file.fileno())  # The data must be on disk before the rename can reach it
+            os.replace(temporary_file, self.storage_file)
+            _fsync_directory(os.path.dirname(self.storage_file))
+
+    def _drain_journal_queue(self):
+        """
+        Take all journal lines queued so far.
+        :return: List of serialized journal lines in the order they were recorded.
+        """
+        lines = []
+        try:
+            while True:
+                lines.append(self._journal_queue.get_nowait())
+        except queue.Empty:
+            return lines
+
+    def _write_journal(self, lines):
+        """
+        Append journal lines with one writev per batch and sync the journal once.
+        :param lines: Serialized journal lines.
+        """
+        if not lines:
+            return
+        for start in range(0, len(lines), _JOURNAL_BATCH_SIZE):
+            batch = lines[start:start + _JOURNAL_BATCH_SIZE]
+            written = os.writev(self._orders_journal, batch)
+            if written < sum(map(len, batch)):  # writev may return after a partial write
+                remainder = b"".join(batch)[written:]
+                while remainder:
+                    remainder = remainder[os.write(self._orders_journal, remainder):]
+        _fdatasync(self._orders_journal)
 
     def _load_persistent_data(self):
-        with open(self.storage_file, "r") as file:
-            state = json.load(file)
-        self.real_balance = defaultdict(float, state.get("real_balance", {}))
-        self.loaned_balance = defaultdict(float, state.get("loaned_balance", {}))
+        with open(self.storage_file, "rb") as file:
+            state = loads(file.read())
+        self.real_balance = dict(state.get("real_balance", {}))
+        self.loaned_balance = dict(state.get("loaned_balance", {}))
         self.positions = defaultdict(
             lambda: {"long": 0, "short": 0, "long_entry_price": None, "short_entry_price": None},
             state.get("positions", {})
         )
-        self.orders = state.get("orders", [])
+        if "orders" in state:
+            # Older state files embed the orders, move them to the front of the journal once
+            journal = b""
+            if os.path.exists(self.orders_file):
+                with open(self.orders_file, "rb") as file:
+                    journal = file.read()
+            with open(self.orders_file, "wb") as file:
+                file.writelines(dumps(order) + b"\n" for order in state["orders"])
+                file.write(journal)
+                file.flush()
+                os.fsync(file.fileno())
+        if os.path.exists(self.orders_file):
+            self.orders.extend(Order.from_dict(loads(line)) for line in self._read_journal_tail())
+        self._orders_journal = os.open(self.orders_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        if "orders" in state:
+            # Drop the embedded orders from the state file right away, a crash before the next debounced flush
+            # would otherwise migrate them into the journal a second time
+            self._save_persistent_data()
+            self.flush()
+
+    def _read_journal_tail(self):
+        """
+        Read the most recent lines of the orders journal, repairing a last line torn by a crash during an append.
+        :return: List of serialized journal lines, at most as many as orders are kept in memory.
+        """
+        limit = self.orders.maxlen
+        with open(self.orders_file, "rb+") as file:
+            end = file.seek(0, os.SEEK_END)
+            start = end
+            data = b""
+            # Read blocks from the end until they hold more lines than are kept, the first one may be cut off
+            while start > 0 and (limit is None or data.count(b"\n") <= limit):
+                block_start = max(0, start - _JOURNAL_READ_BLOCK)
+                file.seek(block_start)
+                data = file.read(start - block_start) + data
+                start = block_start
+            lines = data.split(b"\n")
+            torn = lines.pop()  # Anything after the last newline was never completely appended
+            if start > 0:
+                lines.pop(0)
+            if torn:
+                try:
+                    loads(torn)
+                except ValueError:
+                    logger.warning(f"[{self.exchange_name}] Dropping incomplete last line of the orders journal")
+                    file.truncate(end - len(torn))
+                else:
+                    # Only the newline is missing, complete the line so the next append doesn't join it
+                    file.seek(end)
+                    file.write(b"\n")
+                    lines.append(torn)
+        lines = [line for line in lines if line.strip()]
+        return lines if limit is None else lines[-limit:]
+
+    def _reset_orders_journal(self):
+        """Empty the orders journal, dropping queued lines, and keep it open for appending."""
+        with self._flush_lock:
+            self._drain_journal_queue()
+            if self._orders_journal is None:
+                self._orders_journal = os.open(self.orders_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            os.ftruncate(self._orders_journal, 0)
+
+    def _record_order(self, order):
+        """
+        Keep an order in memory and append it to the orders journal.
+        :param order: The Order to record.
+        """
+        self.orders.append(order)
+        if self.persist:
+            self._journal_queue.put(dumps(order.to_dict()) + b"\n")
+            self._dirty.set()
 
     def hard_reset(self, initial_funds=None):
         """
         Reset all balances and positions to their initial state.
         :param initial_funds: Dictionary of initial balances, e.g., {'USDT': 10000}.
         """
-        self.real_balance = defaultdict(float, initial_funds or {})
-        self.loaned_balance = defaultdict(float)
-        self.positions = defaultdict(lambda: {"long": 0, "short": 0, "long_entry_price": None, "short_entry_price": None})
-        self.orders = []
+        with self._state_lock:
+            self.real_balance = dict(initial_funds or {})
+            self.loaned_balance = {}
+            self.positions = defaultdict(lambda: {"long": 0, "short": 0, "long_entry_price": None,
+                                                  "short_entry_price": None})
+            self.orders.clear()
+        if self.persist:
+            self._reset_orders_journal()
         self._save_persistent_data()
         logger.debug(f"[{self.exchange_name}] Hard reset performed. Balances set to initial state.")
 
+    @staticmethod
+    def format_timestamp_ns(timestamp_ns):
+        """
+        Format an order timestamp recorded with time.time_ns().
+        :param timestamp_ns: Nanoseconds since the epoch.
+        :return: The UTC time as a naive ISO 8601 string, as orders used to record it.
+        """
+        seconds, nanoseconds = divmod(timestamp_ns, 1_000_000_000)
+        created_at = datetime.fromtimestamp(seconds, timezone.utc).replace(microsecond=nanoseconds // 1000, tzinfo=None)
+        return created_at.isoformat()
+
     def get_fee(self, amount, price):
         """
         Calculate the trading fee.
@@ -94,36 +286,47 @@ class SimulatedExchange:
         """
         return amount * price * self.fee_rate
 
+    def _split_symbol(self, symbol):
+        """
+        Split a symbol into its base and quote asset, caching the result.
+        :param symbol: Trading symbol (e.g., 'BTC/USD').
+        :return: Tuple of (base asset, quote asset).
+        """
+        pair = self._pair_cache.get(symbol)
+        if pair is None:
+            base_asset, separator, quote_asset = symbol.partition('/')
+            if not separator:
+                raise ValueError(f"Invalid symbol {symbol}, expected BASE/QUOTE.")
+            pair = self._pair_cache[symbol] = (base_asset, quote_asset)
+        return pair
+
     def place_order(self, symbol, side, amount, price):
-        base_asset, quote_asset = symbol.split('/')
-        margin_cost = (price * amount) / self.leverage
-        fee = self.get_fee(amount, price)
-        total_cost = margin_cost + fee
-
-        if side == 'buy':  # Long position
-            if self.real_balance[quote_asset] < total_cost:
-                raise ValueError(f"Insufficient {quote_asset} balance for margin. balance: {self.real_balance[quote_asset]}, cost: {total_cost}")
-            self.real_balance[quote_asset] -= total_cost
-            self.positions[symbol]["long"] += amount
-            if self.positions[symbol].get("long_entry_price") is None:
-                self.positions[symbol]["long_entry_price"] = price  # Set entry price for long positions
-
-        elif side == 'sell':  # Short position
-            if self.real_balance[quote_asset] < total_cost:
-                raise ValueError(f"Insufficient {quote_asset} balance for margin. balance: {self.real_balance[quote_asset]}, cost: {total_cost}")
-            self.real_balance[quote_asset] -= total_cost
-            self.positions[symbol]["short"] += amount
-            if self.positions[symbol].get("short_entry_price") is None:
-                self.positions[symbol]["short_entry_price"] = price  # Set entry price for short positions
-        self.orders += [{
-            'symbol': symbol,
-            'side': side,
-            'amount': amount,
-            'price': price,
-            'fee': fee,
-            'created_at': datetime.utcnow().isoformat(),
-        }]
-        self._save_persistent_data()
+        base_asset, quote_asset = self._split_symbol(symbol)
+        notional = price * amount
+        fee = notional * self.fee_rate
+        total_cost = notional * self._margin_fee_rate  # Margin plus fee
+
+        with self._state_lock:
+            if side == 'buy':  # Long position
+                balance = self.real_balance.get(quote_asset, 0.0)
+                if balance < total_cost:
+                    raise ValueError(f"Insufficient {quote_asset} balance for margin. balance: {balance}, cost: {total_cost}")
+                self.real_balance[quote_asset] = balance - total_cost
+                self.positions[symbol]["long"] += amount
+                if self.positions[symbol].get("long_entry_price") is None:
+                    self.positions[symbol]["long_entry_price"] = price  # Set entry price for long positions
+
+            elif side == 'sell':  # Short position
+                balance = self.real_balance.get(quote_asset, 0.0)
+                if balance < total_cost:
+                    raise ValueError(f"Insufficient {quote_asset} balance for margin. balance: {balance}, cost: {total_cost}")
+                self.real_balance[quote_asset] = balance - total_cost
+                self.positions[symbol]["short"] += amount
+                if self.positions[symbol].get("short_entry_price") is None:
+                    self.positions[symbol]["short_entry_price"] = price  # Set entry price for short positions
+            self._record_order(Order(symbol, side, amount, price, fee=fee))
+        if self.persist:  # Skip the call entirely for in-memory simulations
+            self._save_persistent_data()
 
     def close_position(self, symbol, side, amount, price):
         if symbol not in self.positions:
@@ -131,43 +334,38 @@ class SimulatedExchange:
         if side not in self.positions[symbol] or self.positions[symbol][side] < amount:
             raise ValueError(f"Not enough {side} position to close {amount} {symbol}.")
 
-        base_asset, quote_asset = symbol.split('/')
+        base_asset, quote_asset = self._split_symbol(symbol)
         pnl = 0
         entry_price = None
-        if side == 'long':
-            entry_price = self.positions[symbol].get("long_entry_price")
-            if not entry_price:
-                raise ValueError(f"Entry price not set for long position in {symbol}.")
-
-            self.positions[symbol]["long"] -= amount
-            pnl = (price - entry_price) * amount - self.get_fee(amount, price)
-            self.real_balance[quote_asset] += pnl + (entry_price * amount / self.leverage)
-
-            # Clear entry price if the long position is fully closed
-            if self.positions[symbol]["long"] == 0:
-                self.positions[symbol]["long_entry_price"] = None
-
-        elif side == 'short':
-            entry_price = self.positions[symbol].get("short_entry_price")
-            if not entry_price:
-                raise ValueError(f"Entry price not set for short position in {symbol}.")
-
-            self.positions[symbol]["short"] -= amount
-            pnl = (entry_price - price) * amount - self.get_fee(amount, price)
-            self.real_balance[quote_asset] += pnl + (entry_price * amount / self.leverage)
-
-            # Clear entry price if the short position is fully closed
-            if self.positions[symbol]["short"] == 0:
-                self.positions[symbol]["short_entry_price"] = None
-        self.orders += [{
-            'symbol': symbol,
-            'side': side,
-            'amount': amount,
-            'price': price,
-            'pnl': pnl,
-            'created_at': datetime.utcnow().isoformat(),
-        }]
-        self._save_persistent_data()
+        with self._state_lock:
+            if side == 'long':
+                entry_price = self.positions[symbol].get("long_entry_price")
+                if not entry_price:
+                    raise ValueError(f"Entry price not set for long position in {symbol}.")
+
+                self.positions[symbol]["long"] -= amount
+                pnl = (price - entry_price) * amount - self.get_fee(amount, price)
+                self.real_balance[quote_asset] = self.real_balance.get(quote_asset, 0.0) + (pnl + entry_price * amount * self._inv_leverage)
+
+                # Clear entry price if the long position is fully closed
+                if self.positions[symbol]["long"] == 0:
+                    self.positions[symbol]["long_entry_price"] = None
+
+            elif side == 'short':
+                entry_price = self.positions[symbol].get("short_entry_price")
+                if not entry_price:
+                    raise ValueError(f"Entry price not set for short position in {symbol}.")
+
+                self.positions[symbol]["short"] -= amount
+                pnl = (entry_price - price) * amount - self.get_fee(amount, price)
+                self.real_balance[quote_asset] = self.real_balance.get(quote_asset, 0.0) + (pnl + entry_price * amount * self._inv_leverage)
+
+                # Clear entry price if the short position is fully closed
+                if self.positions[symbol]["short"] == 0:
+                    self.positions[symbol]["short_entry_price"] = None
+            self._record_order(Order(symbol, side, amount, price, pnl=pnl))
+        if self.persist:  # Skip the call entirely for in-memory simulations
+            self._save_persistent_data()
 
         return {
             'symbol': symbol,
@@ -1,65 +1,136 @@
+import math
+import sys
+
 from src.logger import logger
 
+_CLOSE_TPL = ("Closed positions: Long on %s (Entry: %s, Close: %s) and Short on %s (Entry: %s, Close: %s), "
+              "Amount: %s %s, PnL: Long = %.2f, Short = %.2f, Total = %.2f")
+
 
 class MessageProcessor:
+    __slots__ = ('simulators', 'arbitrage_detector', 'base_trade_amount', '_interned', '_pairs')
+
     def __init__(self, simulators, arbitrage_detector, base_trade_amount=10):
         self.simulators = simulators
         self.arbitrage_detector = arbitrage_detector
         self.base_trade_amount = base_trade_amount
+        self._interned = {name: sys.intern(name) for name in simulators}  # Canonical exchange/instrument names
+        self._pairs = {}  # (buy exchange, sell exchange) -> (buy simulator, sell simulator)
+
+    def _intern(self, value):
+        """Return the canonical instance of a name seen in incoming messages."""
+        interned = self._interned.get(value)
+        if interned is None:
+            interned = self._interned[value] = sys.intern(value)
+        return interned
+
+    def _simulator_pair(self, buy_exchange, sell_exchange):
+        """
+        Resolve the simulators of an exchange pair, caching the result.
+        :param buy_exchange: Name of the exchange holding the long side.
+        :param sell_exchange: Name of the exchange holding the short side.
+        :return: Tuple of (buy simulator, sell simulator).
+        """
+        key = (buy_exchange, sell_exchange)
+        pair = self._pairs.get(key)
+        if pair is None:
+            pair = self._pairs[key] = (self.simulators[buy_exchange], self.simulators[sell_exchange])
+        return pair
 
     def process_message(self, message):
+        symbol = self._update_prices(message)
+        if symbol is not None:
+            self._handle_opportunities(symbol)
+
+    def process_batch(self, messages):
+        """
+        Process a batch of messages, updating all prices first and then detecting once per touched symbol.
+        :param messages: The parsed messages, in arrival order.
+        """
+        symbols = {}  # Touched symbols in first-seen order
+        for message in messages:
+            symbol = self._update_prices(message)
+            if symbol is not None:
+                symbols[symbol] = None
+        for symbol in symbols:
+            self._handle_opportunities(symbol)
+
+    def _update_prices(self, message):
+        """
+        Record the price carried by a message.
+        :param message: The parsed message.
+        :return: The symbol of the message, or None if the message is malformed or its price is invalid.
+        """
+        # Only malformed messages are expected to fail here, the trade handlers guard their own simulator calls
         try:
-            # print(f"Processing message: {message}")
-            symbol = message["instrument_id"].replace("-", "/")
+            message["exchange"] = self._intern(message["exchange"])
+            message["instrument_id"] = self._intern(message["instrument_id"])
+            symbol = self.arbitrage_detector.to_symbol(message["instrument_id"])  # Cached by the detector
+            price = message["price"]
+            # A non-positive or non-finite price would poison the detector's extremes until the exchange quotes again
+            if isinstance(price, bool) or not isinstance(price, (int, float)) or not math.isfinite(price) or price <= 0:
+                raise ValueError(f"Invalid price {price!r} for {symbol} on {message['exchange']}")
             self.arbitrage_detector.update_prices(message)
-
+        except (KeyError, TypeError, AttributeError, ValueError) as e:
+            logger.error("Error processing message: %s", e)
+            return None
+        return symbol
+
+    def _handle_opportunities(self, symbol):
+        """
+        Detect and act on the opportunities of a symbol at its current prices.
+        A failing detection is logged, so it can't take down the other symbols of a batch.
+        :param symbol: The symbol (e.g., 'BTC/USD').
+        """
+        try:
             opportunities = self.arbitrage_detector.detect_opportunity(symbol)
-            if opportunities:
-                for opportunity in opportunities:
-                    if opportunity["type"] == "open":
-                        self._execute_arbitrage(opportunity)
-                    elif opportunity["type"] == "close":
-                        self._close_positions(opportunity)
-            else:
-                # print(f"No opportunities for {symbol}.")
-                pass
         except Exception as e:
-            print(f"Error processing message: {e}")
+            logger.error("Error detecting opportunities for %s: %s", symbol, e)
+            return
+        if opportunities:
+            for opportunity in opportunities:
+                if opportunity.type == "open":
+                    self._execute_arbitrage(opportunity)
+                elif opportunity.type == "close":
+                    self._close_positions(opportunity)
 
     def _execute_arbitrage(self, opportunity):
+        placed = False
         try:
-            symbol = opportunity["symbol"]
-            buy_exchange = opportunity["buy_exchange"]
-            sell_exchange = opportunity["sell_exchange"]
-            buy_price = opportunity["buy_price"]
-            sell_price = opportunity["sell_price"]
-            spread = opportunity["spread"]
-
-            quote_amount = self.base_trade_amount * self.simulators[buy_exchange].leverage
+            symbol = opportunity.symbol
+            buy_exchange = opportunity.buy_exchange
+            sell_exchange = opportunity.sell_exchange
+            buy_price = opportunity.buy_price
+            sell_price = opportunity.sell_price
+            spread = opportunity.spread
+
+            buy_simulator, sell_simulator = self._simulator_pair(buy_exchange, sell_exchange)
+            quote_amount = self.base_trade_amount * buy_simulator.leverage
             base_amount = quote_amount / buy_price
 
-            buy_simulator = self.simulators[buy_exchange]
-            sell_simulator = self.simulators[sell_exchange]
-
-            buy_simulator.place_order(symbol, side="buy", amount=base_amount, price=buy_price)
-            sell_simulator.place_order(symbol, side="sell", amount=base_amount, price=sell_price)
+            buy_simulator.place_order(symbol, "buy", base_amount, buy_price)
+            placed = True
+            sell_simulator.place_order(symbol, "sell", base_amount, sell_price)
 
-            logger.info(f"Opened arbitrage: Long on {buy_exchange} at {buy_price}, Short on {sell_exchange} at {sell_price}, Spread: {spread:.2f}% for {symbol}")
+            logger.info("Opened arbitrage: Long on %s at %s, Short on %s at %s, Spread: %.2f%% for %s",
+                        buy_exchange, buy_price, sell_exchange, sell_price, spread, symbol)
         except Exception as e:
-            print(f"Error executing arbitrage: {e}")
+            logger.error("Error executing arbitrage: %s", e)
+            if not placed:
+                # Nothing was opened, let the detector offer the pair again
+                self.arbitrage_detector.release_pair(opportunity.pair_key)
 
     def _close_positions(self, opportunity):
         try:
-            symbol = opportunity["symbol"]
-            buy_exchange = opportunity["buy_exchange"]
-            sell_exchange = opportunity["sell_exchange"]
-            buy_price = opportunity["buy_price"]
-            sell_price = opportunity["sell_price"]
-            amount = opportunity["amount"]
-            pair_key = opportunity["pair_key"]
+            symbol = opportunity.symbol
+            buy_exchange = opportunity.buy_exchange
+            sell_exchange = opportunity.sell_exchange
+            buy_price = opportunity.buy_price
+            sell_price = opportunity.sell_price
+            amount = opportunity.amount
+            pair_key = opportunity.pair_key
 
-            buy_simulator = self.simulators[buy_exchange]
-            sell_simulator = self.simulators[sell_exchange]
+            buy_simulator, sell_simulator = self._simulator_pair(buy_exchange, sell_exchange)
 
             # Close the long and short positions
             buy_result = buy_simulator.close_position(symbol, "long", amount, buy_price)
@@ -75,17 +146,13 @@ class MessageProcessor:
             # sell_entry_price = sell_simulator.positions[symbol]["short_entry_price"]
 
             # Print summary
-            logger.info(
-                f"Closed positions: Long on {buy_exchange} (Entry: {buy_entry_price}, Close: {buy_price}) "
-                f"and Short on {sell_exchange} (Entry: {sell_entry_price}, Close: {sell_price}), "
-                f"Amount: {amount} {symbol}, "
-                f"PnL: Long = {pnl1:.2f}, Short = {pnl2:.2f}, Total = {total_pnl:.2f}"
-            )
+            logger.info(_CLOSE_TPL, buy_exchange, buy_entry_price, buy_price, sell_exchange, sell_entry_price,
+                        sell_price, amount, symbol, pnl1, pnl2, total_pnl)
 
             # Remove the pair key from active arbitrage pairs
-            self.arbitrage_detector.arbitrage_pairs.discard(pair_key)
+            self.arbitrage_detector.release_pair(pair_key)
 
             return total_pnl
         except Exception as e:
-            print(f"Error closing positions: {e}")
+            logger.error("Error closing positions: %s", e)
             return None
@@ -0,0 +1,99 @@
+import asyncio
+
+from src.logger import logger
+
+
+class OrderBatcher:
+    def __init__(self, exchange, interval_ms=100, max_batch_size=100, rate_limiter=None):
+        """
+        Initialize the OrderBatcher.
+        Orders are collected for up to interval_ms and sent together with the exchange's batch order endpoint.
+        :param exchange: The asynchronous ccxt exchange client.
+        :param interval_ms: Maximum time an order waits for others to join its batch.
+        :param max_batch_size: Maximum number of orders sent in one request.
+        :param rate_limiter: Optional TokenBucket taken once per batch request.
+        """
+        self.exchange = exchange
+        self.interval_ms = interval_ms
+        self.max_batch_size = max(1, max_batch_size)
+        self.rate_limiter = rate_limiter
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        """Start the background task flushing the batches. Must be called from the running event loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, symbol, order_type, side, amount, price=None):
+        """
+        Queue an order for the next batch.
+        :param symbol: The unified trading symbol (e.g., 'BTC/USDT').
+        :param order_type: 'limit' or 'market'.
+        :param side: 'buy' or 'sell'.
+        :param amount: The amount to trade.
+        :param price: The price for limit orders (None for market orders).
+        :return: The exchange's response for this order.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(({
+            "symbol": symbol,
+            "type": order_type,
+            "side": side,
+            "amount": amount,
+            "price": price,
+        }, future))
+        return await future
+
+    async def _run(self):
+        """Collect queued orders into batches and send them until cancelled."""
+        loop = asyncio.get_running_loop()
+        interval = self.interval_ms / 1000
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + interval
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        """
+        Send a batch of orders and resolve each caller's future with its slot of the response.
+        :param batch: List of (order, future) tuples.
+        """
+        try:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+            results = await self.exchange.create_orders([order for order, _ in batch])
+        except Exception as e:
+            logger.error("Failed to send batch of %d orders: %s", len(batch), e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+        for _, future in batch[len(results):]:
+            if not future.done():
+                future.set_exception(RuntimeError("Exchange returned no result for the order"))
+
+    async def close(self):
+        """Stop the background task and fail the orders that were not sent."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Order batcher closed before the order was sent"))
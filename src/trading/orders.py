@@ -0,0 +1,60 @@
+import time
+from datetime import datetime, timezone
+
+
+class Order:
+    __slots__ = ('symbol', 'side', 'amount', 'price', 'fee', 'pnl', 'created_at_ns')
+
+    def __init__(self, symbol, side, amount, price, fee=None, pnl=None, created_at_ns=None):
+        """
+        Initialize an order record of the simulated exchange.
+        :param symbol: Trading symbol (e.g., 'BTC/USD').
+        :param side: 'buy' or 'sell' for opened positions, 'long' or 'short' for closed ones.
+        :param amount: Amount traded.
+        :param price: Price per unit.
+        :param fee: Fee paid when opening a position.
+        :param pnl: Realized PnL when closing a position.
+        :param created_at_ns: Creation time in nanoseconds since the epoch, defaults to now.
+        """
+        self.symbol = symbol
+        self.side = side
+        self.amount = amount
+        self.price = price
+        self.fee = fee
+        self.pnl = pnl
+        self.created_at_ns = time.time_ns() if created_at_ns is None else created_at_ns
+
+    def to_dict(self):
+        """
+        Convert the order to the dictionary stored in the orders journal.
+        :return: The order as a dictionary, without the fee or PnL field it does not carry.
+        """
+        order = {
+            'symbol': self.symbol,
+            'side': self.side,
+            'amount': self.amount,
+            'price': self.price,
+        }
+        if self.fee is not None:
+            order['fee'] = self.fee
+        if self.pnl is not None:
+            order['pnl'] = self.pnl
+        order['created_at_ns'] = self.created_at_ns
+        return order
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Create an order from a journal entry, including entries recorded with an ISO 'created_at' string.
+        :param data: The order as a dictionary.
+        :return: The Order.
+        """
+        created_at_ns = data.get('created_at_ns')
+        if created_at_ns is None and 'created_at' in data:
+            created_at = datetime.fromisoformat(data['created_at']).replace(tzinfo=timezone.utc)
+            created_at_ns = int(created_at.timestamp()) * 1_000_000_000 + created_at.microsecond * 1000
+        return cls(data['symbol'], data['side'], data['amount'], data['price'], data.get('fee'), data.get('pnl'),
+                   created_at_ns)
+
+    def __repr__(self):
+        return f"Order({self.to_dict()})"
@@ -2,6 +2,8 @@ from src.logger import logger
 
 
 class PositionManager:
+    __slots__ = ('positions',)
+
     def __init__(self):
         """
         Initialize the PositionManager to track open positions.
@@ -19,7 +21,7 @@ class PositionManager:
             "amount": amount,
             "entry_price": price,
         }
-        logger.info(f"Position added: {instrument_id}, amount: {amount}, price: {price}")
+        logger.info("Position added: %s, amount: %s, price: %s", instrument_id, amount, price)
 
     def close_position(self, instrument_id):
         """
@@ -29,5 +31,5 @@ class PositionManager:
         """
         position = self.positions.pop(instrument_id, None)
         if position:
-            logger.info(f"Position closed: {instrument_id}, details: {position}")
+            logger.info("Position closed: %s, details: %s", instrument_id, position)
         return position
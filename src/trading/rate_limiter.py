@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        """
+        Initialize the TokenBucket.
+        Callers may burst up to capacity requests, after which they are paced at rate requests per second.
+        :param rate: Number of tokens refilled per second.
+        :param capacity: Maximum number of tokens the bucket holds.
+        """
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        """Add the tokens accumulated since the last refill."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Take one token, waiting for the refill if the bucket is empty. Waiters are served in arrival order."""
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
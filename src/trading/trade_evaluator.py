@@ -1,5 +1,4 @@
-import json
-
+from src.io.serialization import loads
 from src.logger import logger
 
 
@@ -14,11 +13,11 @@ class TradeEvaluator:
     def evaluate(self, message):
         """
         Evaluate the incoming message to determine if a trade opportunity exists.
-        :param message: The parsed message as a dictionary.
+        :param message: The raw JSON message (bytes or str).
         :return: A dictionary with evaluation results or None if no trade opportunity exists.
         """
         try:
-            data = json.loads(message)
+            data = loads(message)
             price = data.get("price")
             best_bid = data.get("best_bid")
             best_ask = data.get("best_ask")
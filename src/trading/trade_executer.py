@@ -1,25 +1,140 @@
-import ccxt
+import asyncio
+import logging
+import ssl
+from collections import OrderedDict
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+import aiohttp
+import ccxt.async_support as ccxt
+import ccxt.pro as ccxtpro
 
 from src.logger import logger
+from src.trading.order_batcher import OrderBatcher
+from src.trading.rate_limiter import TokenBucket
+
+# Assets the exchanges quote under a different name than the price feed
+_ASSET_MAP = {"USD": "USDT"}
+# Order statuses after which an order no longer changes
+_FINAL_STATUSES = frozenset(("closed", "canceled", "expired", "rejected"))
+# Number of finished orders remembered for wait_for_fill calls that come after the update
+_FINISHED_ORDERS_KEPT = 1000
+# HTTP statuses ccxt reports as ExchangeNotAvailable although the exchange answered and refused the request
+_REJECTED_HTTP_EXCEPTIONS = {
+    "400": ccxt.BadRequest,
+    "403": ccxt.PermissionDenied,
+    "404": ccxt.BadRequest,
+    "405": ccxt.BadRequest,
+}
 
 
 class TradeExecutor:
-    def __init__(self, exchange_name, api_key, api_secret, demo_mode=True):
+    def __init__(self, exchange_name, api_key, api_secret, demo_mode=True, connection_limit=32,
+                 keepalive_timeout=90, dns_cache_ttl=300, batch_orders=False, batch_interval_ms=100,
+                 max_batch_size=100, rate_limit_burst=None, max_retries=2, retry_backoff=0.05, watch_fills=True):
         """
         Initialize the TradeExecutor.
+        Orders are sent through the asynchronous ccxt client, so concurrent trades don't block each other.
         :param exchange_name: Name of the exchange (e.g., 'binance').
         :param api_key: API key for the exchange.
         :param api_secret: API secret for the exchange.
         :param demo_mode: True for demo mode, False for live trading.
+        :param connection_limit: Maximum number of pooled connections to the exchange.
+        :param keepalive_timeout: Seconds an idle connection is kept open for reuse.
+        :param dns_cache_ttl: Seconds a resolved exchange host is cached.
+        :param batch_orders: Send orders through the exchange's batch order endpoint, if it has one.
+        :param batch_interval_ms: Maximum time an order waits for others to join its batch.
+        :param max_batch_size: Maximum number of orders sent in one batch request.
+        :param rate_limit_burst: Number of requests that may be sent back to back before being paced at the exchange's
+            rate limit. None keeps ccxt's own rate limiter, which paces every request.
+        :param max_retries: Number of times an order is resent after the exchange throttled it.
+        :param retry_backoff: Seconds to wait before the first retry, doubled for each further one.
+        :param watch_fills: Stream order updates from open() on, so wait_for_fill sees every fill.
         """
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.exchange_name = exchange_name
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.demo_mode = demo_mode
+        self.connection_limit = connection_limit
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.watch_fills = watch_fills
         self.exchange = getattr(ccxt, exchange_name)({
             "apiKey": api_key,
             "secret": api_secret,
         })
         if demo_mode and hasattr(self.exchange, "set_sandbox_mode"):
             self.exchange.set_sandbox_mode(True)
+        # Raise refused requests as exchange errors rather than transient network errors
+        self.exchange.httpExceptions = {**self.exchange.httpExceptions, **_REJECTED_HTTP_EXCEPTIONS}
+        self.markets = None
+        self.rate_limiter = None
+        if rate_limit_burst:
+            # Replace ccxt's per-call pacing with a bucket that lets bursts through
+            self.exchange.enableRateLimit = False
+            self.rate_limiter = TokenBucket(1000 / self.exchange.rateLimit, rate_limit_burst)
+        self._create_order = self.exchange.create_order
+        self._submitted = set()
+        self.batcher = None
+        if batch_orders and self.exchange.has.get("createOrders"):
+            self.batcher = OrderBatcher(self.exchange, interval_ms=batch_interval_ms, max_batch_size=max_batch_size,
+                                        rate_limiter=self.rate_limiter)
+            self._create_order = self.batcher.submit
+        # Websocket client streaming order updates, started by open() or the first wait_for_fill
+        self.pro = None
+        self._order_stream = None
+        self._fills = {}
+        self._finished = OrderedDict()
+
+    async def open(self):
+        """
+        Create the pooled HTTP session of the exchange client and load the exchange markets.
+        Must be awaited from the running event loop before the first trade.
+        """
+        if self.exchange.session is None:
+            # Verify certificates the way ccxt's own session does (certifi CA file, 'verify' option)
+            ssl_context = getattr(self.exchange, "ssl_context", None)
+            if ssl_context is None and self.exchange.verify:
+                ssl_context = ssl.create_default_context(cafile=getattr(self.exchange, "cafile", None))
+            elif ssl_context is None:
+                ssl_context = False
+            # Keep TLS connections to the exchange alive so successive orders skip the handshake
+            connector = aiohttp.TCPConnector(ssl=ssl_context, limit=self.connection_limit,
+                                             keepalive_timeout=self.keepalive_timeout, ttl_dns_cache=self.dns_cache_ttl,
+                                             enable_cleanup_closed=True)
+            self.exchange.session = aiohttp.ClientSession(connector=connector, trust_env=self.exchange.aiohttp_trust_env)
+        # Load markets up front so the first order doesn't pay for it
+        self.markets = await self.exchange.load_markets()
+        await self.warmup()
+        if self.batcher is not None:
+            self.batcher.start()
+        if self.watch_fills and self._order_stream is None:
+            # Subscribe before the first order so its fill isn't missed
+            self._start_order_stream()
+
+    async def warmup(self):
+        """
+        Open a pooled connection to the REST hosts orders are sent to.
+        The first order then pays neither DNS resolution nor the TLS handshake, even on hosts load_markets didn't use.
+        """
+        hosts = {urlsplit(self.exchange.implode_hostname(url)).netloc
+                 for url in _iter_order_urls(self.exchange.urls.get("api"))}
+        await asyncio.gather(*[self._warm_host(host) for host in hosts if host])
 
-    def execute_trade(self, instrument_id, side, amount, price=None):
+    async def _warm_host(self, host):
+        """
+        Issue a HEAD request to a host so its connection stays in the pool.
+        :param host: The host name, with an optional port.
+        """
+        try:
+            async with self.exchange.session.head(f"https://{host}/", timeout=aiohttp.ClientTimeout(total=5)):
+                pass
+        except Exception as e:
+            logger.warning("Failed to warm up connection to %s: %s", host, e)
+
+    async def execute_trade(self, instrument_id, side, amount, price=None):
         """
         Execute a trade on the exchange.
         :param instrument_id: The trading pair (e.g., 'BTC/USDT').
@@ -31,25 +146,226 @@ class TradeExecutor:
         try:
             order_type = "limit" if price else "market"
             instrument_id = self.parse_symbol(instrument_id)
-            order = self.exchange.create_order(instrument_id, order_type, side, amount, price)
-            logger.info(f"Executed trade: {order}")
+            attempt = 0
+            while True:
+                if self.rate_limiter is not None and self.batcher is None:
+                    await self.rate_limiter.acquire()
+                try:
+                    order = await self._create_order(instrument_id, order_type, side, amount, price)
+                    break
+                except ccxt.DDoSProtection as e:
+                    # Only throttling proves the order was refused, any other network error may follow an accepted
+                    # order and resending it could open the position twice
+                    if attempt >= self.max_retries:
+                        raise
+                    logger.warning("Retrying trade after being throttled: %s", e)
+                    await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+                    attempt += 1
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Executed trade: id=%s symbol=%s side=%s amount=%s price=%s status=%s", order.get("id"),
+                            order.get("symbol"), order.get("side"), order.get("amount"), order.get("price"),
+                            order.get("status"))
             return order
+        except ccxt.ExchangeError as e:
+            logger.error("Failed to execute trade, rejected by the exchange: %s", e)
+            return None
+        except ccxt.NetworkError as e:
+            # Transient (timeouts, rate limits, maintenance): no traceback needed
+            logger.warning("Failed to execute trade, network error: %s", e)
+            return None
         except Exception as e:
-            logger.error(f"Failed to execute trade: {e}", exc_info=True)
+            logger.error("Failed to execute trade: %s", e, exc_info=True)
             return None
 
-    def parse_symbol(self, instrument_id):
+    def submit_trade(self, instrument_id, side, amount, price=None):
+        """
+        Start a trade without waiting for the exchange's response.
+        Must be called from the running event loop.
+        :param instrument_id: The trading pair (e.g., 'BTC-USD').
+        :param side: 'buy' or 'sell'.
+        :param amount: The amount to trade.
+        :param price: The price for limit orders (None for market orders).
+        :return: A task resolving to the response from the exchange API, or None if the trade failed.
+        """
+        task = asyncio.create_task(self.execute_trade(instrument_id, side, amount, price))
+        # Keep a reference until the trade is done, the event loop only holds a weak one
+        self._submitted.add(task)
+        task.add_done_callback(self._submitted.discard)
+        return task
+
+    async def execute_trades(self, orders):
+        """
+        Execute several trades concurrently.
+        :param orders: Iterable of keyword argument dictionaries for execute_trade.
+        :return: The results in the order of the given trades, exceptions included.
+        """
+        return await asyncio.gather(*[self.execute_trade(**order) for order in orders], return_exceptions=True)
+
+    def _start_order_stream(self):
+        """Create the websocket client and start streaming order updates, if the exchange supports it."""
+        pro = getattr(ccxtpro, self.exchange_name)({
+            "apiKey": self.api_key,
+            "secret": self.api_secret,
+        })
+        if not pro.has.get("watchOrders"):
+            logger.warning("%s does not stream order updates, wait_for_fill is unavailable", self.exchange_name)
+            return
+        if self.demo_mode and hasattr(pro, "set_sandbox_mode"):
+            pro.set_sandbox_mode(True)
+        self.pro = pro
+        self._order_stream = asyncio.create_task(self._stream_orders())
+
+    async def wait_for_fill(self, order, timeout=None):
+        """
+        Wait until an order is filled or otherwise finished, as pushed by the exchange's order stream.
+        Must be awaited from the running event loop.
+        :param order: The order returned by execute_trade.
+        :param timeout: Maximum number of seconds to wait, None to wait indefinitely.
+        :return: The finished order.
+        """
+        if order.get("status") in _FINAL_STATUSES:
+            return order  # Market orders are often filled by the time the exchange answers
+        order_id = order["id"]
+        finished = self._finished.pop(order_id, None)
+        if finished is not None:
+            return finished
+        if self._order_stream is None:
+            self._start_order_stream()
+            if self._order_stream is None:
+                raise ccxt.NotSupported(f"{self.exchange_name} does not stream order updates")
+
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._fills.setdefault(order_id, set())
+        waiters.add(future)
+        try:
+            # The order may have finished before the stream subscribed, check it once now that the waiter is registered
+            try:
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire()
+                current = await self.exchange.fetch_order(order_id, order.get("symbol"))
+            except Exception as e:
+                logger.warning("Failed to fetch order %s, waiting for the order stream: %s", order_id, e)
+            else:
+                if current.get("status") in _FINAL_STATUSES and not future.done():
+                    future.set_result(current)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            # Drop the waiter, also when it timed out, so no future is left behind for this order
+            waiters.discard(future)
+            if not waiters and self._fills.get(order_id) is waiters:
+                del self._fills[order_id]
+
+    async def _stream_orders(self):
+        """Resolve the futures of wait_for_fill with the finished orders streamed by the exchange, until cancelled."""
+        while True:
+            try:
+                orders = await self.pro.watch_orders()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Order stream error: %s", e)
+                await asyncio.sleep(1)
+                continue
+            for order in orders:
+                if order.get("status") not in _FINAL_STATUSES:
+                    continue
+                waiters = self._fills.pop(order["id"], None)
+                if not waiters:
+                    # Nobody waits for it yet, remember it for a wait_for_fill that comes later
+                    self._finished[order["id"]] = order
+                    if len(self._finished) > _FINISHED_ORDERS_KEPT:
+                        self._finished.popitem(last=False)
+                    continue
+                for future in waiters:
+                    if not future.done():
+                        future.set_result(order)
+
+    async def close(self):
+        """
+        Wait for submitted trades, then close the order batcher, the order stream and the exchange clients with their
+        HTTP sessions.
+        """
+        if self._submitted:
+            await asyncio.gather(*self._submitted, return_exceptions=True)
+        if self.batcher is not None:
+            await self.batcher.close()
+        if self._order_stream is not None:
+            self._order_stream.cancel()
+            try:
+                await self._order_stream
+            except asyncio.CancelledError:
+                pass
+            self._order_stream = None
+            await self.pro.close()
+        await self.exchange.close()
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def parse_symbol(instrument_id):
         """
         Parse the symbol for the exchange.
         :param instrument_id: The trading pair (e.g., 'BTC-USD').
         :return: The symbol used by the exchange (e.g., 'BTC/USDT').
         """
-        full_replace = True
-        if "USDT" in instrument_id:
-            full_replace = False
-        if "USD" not in instrument_id:
-            full_replace = False
-        instrument_id = instrument_id.replace("-", "/")
-        if full_replace:
-            instrument_id = instrument_id.replace("USD", "USDT")
-        return instrument_id
+        base, separator, quote = instrument_id.replace("-", "/").partition("/")
+        if not separator:
+            return instrument_id
+        return f"{_ASSET_MAP.get(base, base)}/{_ASSET_MAP.get(quote, quote)}"
+
+
+# Shared executors and the options they were created with, by (exchange name, API key, demo mode)
+_executors = {}
+
+
+def get_executor(exchange_name, api_key, api_secret, demo_mode=True, **options):
+    """
+    Get the shared TradeExecutor of an exchange account, creating it on the first call.
+    Constructing a ccxt client is expensive, so call sites should use this instead of instantiating TradeExecutor.
+    The executor belongs to the event loop it is opened on, release it with close_executors before that loop ends.
+    :param exchange_name: Name of the exchange (e.g., 'binance').
+    :param api_key: API key for the exchange.
+    :param api_secret: API secret for the exchange.
+    :param demo_mode: True for demo mode, False for live trading.
+    :param options: Further TradeExecutor keyword arguments.
+    :return: The TradeExecutor.
+    :raises ValueError: If the account's executor was created with a different secret or options.
+    """
+    key = (exchange_name, api_key, demo_mode)
+    entry = _executors.get(key)
+    if entry is None:
+        executor = TradeExecutor(exchange_name, api_key, api_secret, demo_mode=demo_mode, **options)
+        _executors[key] = (executor, options)
+        return executor
+    executor, created_with = entry
+    if executor.api_secret != api_secret or created_with != options:
+        raise ValueError(f"The shared {exchange_name} executor for this API key was created with a different secret "
+                         f"or options")
+    return executor
+
+
+async def close_executors():
+    """Close all shared executors and forget them."""
+    executors = [executor for executor, _ in _executors.values()]
+    _executors.clear()
+    for executor in executors:
+        try:
+            await executor.close()
+        except Exception as e:
+            logger.error("Failed to close trade executor for %s: %s", executor.exchange_name, e)
+
+
+def _iter_order_urls(urls):
+    """
+    Yield the URLs of a ccxt 'api' URL definition that private requests such as orders go to.
+    The definition is a string or a nested dictionary of strings. Where a level has a 'private' entry, only that entry is
+    followed, so public-only hosts (help center, market data) are skipped.
+    :param urls: The URL definition.
+    """
+    if isinstance(urls, str):
+        yield urls
+    elif isinstance(urls, dict):
+        if "private" in urls:
+            yield from _iter_order_urls(urls["private"])
+        else:
+            for value in urls.values():
+                yield from _iter_order_urls(value)